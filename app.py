@@ -1,14 +1,16 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from models import db, Vehiculo, Ruta
-from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, SelectField, FloatField
-from wtforms.validators import DataRequired, Length, NumberRange, ValidationError
-import secrets
+from models import db, Vehiculo, Ruta, crear_busqueda_vehiculos, ids_vehiculos_por_texto
+from flask_caching import Cache
+from jinja2 import FileSystemBytecodeCache
 from dotenv import load_dotenv
 import os 
 import logging
+import sqlite3
+from functools import wraps
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import exists, and_
+from sqlalchemy import exists, and_, func, case, event, update, select
+from sqlalchemy.orm import joinedload, selectinload, Session
+from sqlalchemy.engine import Engine
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +26,7 @@ def configure_app():
     # Generar SECRET_KEY segura si no existe
     secret_key = os.getenv("SECRET_KEY")
     if not secret_key:
+        import secrets
         secret_key = secrets.token_hex(32)
         logger.warning("SECRET_KEY no encontrada, generando una temporal")
     
@@ -32,81 +35,163 @@ def configure_app():
         "sqlite:///transporte.db"
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Pool de conexiones y caché de SQL compilado; SQLite en memoria no admite tamaño de pool
+    engine_options = {'pool_pre_ping': True, 'pool_recycle': 3600, 'query_cache_size': 1200}
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        engine_options.update(pool_size=20, max_overflow=10)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
     app.config['SECRET_KEY'] = secret_key
     app.config['WTF_CSRF_ENABLED'] = True
+    
+    # Caché: Redis si hay URL configurada, en memoria en caso contrario
+    redis_url = os.getenv("CACHE_REDIS_URL")
+    app.config['CACHE_TYPE'] = os.getenv(
+        "CACHE_TYPE",
+        "RedisCache" if redis_url else "SimpleCache"
+    )
+    app.config['CACHE_REDIS_URL'] = redis_url
+    app.config['CACHE_DEFAULT_TIMEOUT'] = 30
+    
+    # Sesiones del lado del servidor en Redis (cookie solo con el id de sesión)
+    session_redis_url = os.getenv("SESSION_REDIS_URL", redis_url)
+    if session_redis_url:
+        import redis
+        app.config['SESSION_TYPE'] = 'redis'
+        app.config['SESSION_REDIS'] = redis.from_url(session_redis_url)
+        app.config['SESSION_USE_SIGNER'] = False
 
 configure_app()
 
+# Persistir las plantillas compiladas entre reinicios de los workers
+jinja_cache_dir = os.getenv("JINJA_CACHE_DIR")
+if jinja_cache_dir:
+    os.makedirs(jinja_cache_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_dir)
+
+@event.listens_for(Engine, 'connect')
+def configurar_sqlite(dbapi_connection, connection_record):
+    """Activa WAL y ajustes de caché en conexiones SQLite"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # Inicializar extensiones
 db.init_app(app)
+cache = Cache(app)
+if app.config.get('SESSION_TYPE'):
+    from flask_session import Session as ServerSession
+    ServerSession(app)
+
+# Conteos del dashboard y choices de vehículos cacheados con TTL corto
+DASHBOARD_CACHE_KEY = 'dashboard_counts'
+VEHICULOS_DISPONIBLES_CACHE_KEY = 'vehiculos_disponibles_choices'
+
+def obtener_conteos_dashboard():
+    """Devuelve (total_vehiculos, vehiculos_disponibles, total_rutas, rutas_activas)"""
+    conteos = cache.get(DASHBOARD_CACHE_KEY)
+    if conteos is None:
+        # Una consulta por tabla usando agregación condicional
+        total_vehiculos, vehiculos_disponibles = db.session.execute(select(
+            func.count(Vehiculo.id),
+            func.coalesce(func.sum(case((Vehiculo.estado == 'Disponible', 1), else_=0)), 0)
+        )).one()
+        total_rutas, rutas_activas = db.session.execute(select(
+            func.count(Ruta.id),
+            func.coalesce(func.sum(case((Ruta.estado == 'En curso', 1), else_=0)), 0)
+        )).one()
+        conteos = (total_vehiculos, vehiculos_disponibles, total_rutas, rutas_activas)
+        cache.set(DASHBOARD_CACHE_KEY, conteos, timeout=30)
+    return conteos
+
+def obtener_choices_vehiculos_disponibles():
+    """Devuelve [(id, etiqueta)] de los vehículos disponibles"""
+    choices = cache.get(VEHICULOS_DISPONIBLES_CACHE_KEY)
+    if choices is None:
+        # Solo las columnas necesarias, sin construir objetos del ORM
+        filas = db.session.execute(
+            select(Vehiculo.id, Vehiculo.placa, Vehiculo.marca, Vehiculo.modelo)
+            .where(Vehiculo.estado == 'Disponible')
+        ).all()
+        choices = [(id, f"{placa} - {marca} {modelo}") for id, placa, marca, modelo in filas]
+        cache.set(VEHICULOS_DISPONIBLES_CACHE_KEY, choices, timeout=30)
+    return choices
 
-# Validador personalizado para placas
-def validate_placa_format(form, field):
-    """Validador personalizado que asegura formato correcto de placa"""
-    placa = field.data.upper().strip()
-    
-    # Verificar que no esté vacía
-    if not placa:
-        raise ValidationError('La placa es obligatoria')
-    
-    # Verificar longitud
-    if len(placa) < 6 or len(placa) > 8:
-        raise ValidationError('La placa debe tener entre 6 y 8 caracteres')
-    
-    # Verificar caracteres válidos (solo letras y números)
-    if not placa.replace(' ', '').isalnum():
-        raise ValidationError('La placa solo puede contener letras y números')
-    
-    # Actualizar el campo con la versión en mayúsculas
-    field.data = placa
-
-# Formularios con validación
-class VehiculoForm(FlaskForm):
-    placa = StringField('Placa', validators=[
-        DataRequired(), 
-        Length(min=6, max=8, message="La placa debe tener entre 6 y 8 caracteres"),
-        validate_placa_format
-    ])
-    marca = StringField('Marca', validators=[DataRequired(), Length(max=50)])
-    modelo = StringField('Modelo', validators=[DataRequired(), Length(max=50)])
-    anio = IntegerField('Año', validators=[
-        DataRequired(), 
-        NumberRange(min=1990, max=2025, message="Año inválido")
-    ])
-    capacidad = IntegerField('Capacidad', validators=[
-        DataRequired(), 
-        NumberRange(min=1, max=100, message="Capacidad debe ser entre 1 y 100")
-    ])
-    estado = SelectField('Estado', choices=[
-        ('Disponible', 'Disponible'),
-        ('En Ruta', 'En Ruta'),
-        ('Mantenimiento', 'Mantenimiento')
-    ])
-
-class RutaForm(FlaskForm):
-    nombre = StringField('Nombre', validators=[DataRequired(), Length(max=100)])
-    origen = StringField('Origen', validators=[DataRequired(), Length(max=100)])
-    destino = StringField('Destino', validators=[DataRequired(), Length(max=100)])
-    distancia = FloatField('Distancia (km)', validators=[
-        DataRequired(), 
-        NumberRange(min=0.1, message="La distancia debe ser mayor a 0")
-    ])
-    tiempo_estimado = IntegerField('Tiempo Estimado (min)', validators=[
-        DataRequired(), 
-        NumberRange(min=1, message="El tiempo debe ser mayor a 0")
-    ])
-    vehiculo_id = SelectField('Vehículo', coerce=int, validate_choice=False)
-    estado = SelectField('Estado', choices=[
-        ('Programada', 'Programada'),
-        ('En curso', 'En curso'),
-        ('Completada', 'Completada'),
-        ('Cancelada', 'Cancelada')
-    ])
+@event.listens_for(Session, 'after_flush')
+def marcar_cambios_cacheados(session, flush_context):
+    """Marca la sesión si se modificaron vehículos o rutas"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Vehiculo, Ruta)):
+            session.info['invalidar_cache'] = True
+            break
+
+@event.listens_for(Session, 'do_orm_execute')
+def marcar_cambios_masivos(orm_execute_state):
+    """Marca la sesión ante UPDATE/DELETE masivos, que no pasan por flush"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Vehiculo, Ruta):
+            orm_execute_state.session.info['invalidar_cache'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidar_cache(session):
+    """Invalida las entradas cacheadas tras confirmar cambios"""
+    if session.info.pop('invalidar_cache', False):
+        cache.delete_many(DASHBOARD_CACHE_KEY, VEHICULOS_DISPONIBLES_CACHE_KEY)
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_invalidacion(session):
+    session.info.pop('invalidar_cache', None)
+
+# Paginación por cursor (keyset) para evitar COUNT(*) y OFFSET
+class PaginaCursor:
+    """Página de resultados ordenada por id descendente"""
+    def __init__(self, items, per_page, after=None, has_next=False):
+        self.items = items
+        self.per_page = per_page
+        self.after = after
+        self.has_next = has_next
+        self.next_after = items[-1].id if has_next else None
+
+def paginar_por_cursor(stmt, modelo, after=None, per_page=10):
+    """Obtiene la página siguiente al id `after` pidiendo una fila extra para saber si hay más"""
+    if after:
+        stmt = stmt.where(modelo.id < after)
+    
+    stmt = stmt.order_by(modelo.id.desc()).limit(per_page + 1)
+    items = db.session.execute(stmt).scalars().all()
+    has_next = len(items) > per_page
+    return PaginaCursor(items[:per_page], per_page, after=after, has_next=has_next)
+
+# Manejo común de errores en las vistas
+def handle_errors(redirect_endpoint, mensaje):
+    """Revierte la sesión, registra el error y redirige con un mensaje flash"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f"Error en {f.__name__} {kwargs}: {e}")
+                flash(mensaje, 'error')
+                return redirect(url_for(redirect_endpoint))
+        return wrapper
+    return decorator
 
 # Crear tablas
 with app.app_context():
     try:
         db.create_all()
+        # create_all no agrega índices nuevos a tablas que ya existen
+        for tabla in db.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(db.engine, checkfirst=True)
+        app.config['BUSQUEDA_FTS'] = crear_busqueda_vehiculos(db.engine)
         logger.info("Base de datos inicializada correctamente")
     except Exception as e:
         logger.error(f"Error inicializando base de datos: {e}")
@@ -115,11 +200,8 @@ with app.app_context():
 @app.route('/')
 def index():
     try:
-        # Consultas separadas y más simples
-        total_vehiculos = Vehiculo.query.count()
-        vehiculos_disponibles = Vehiculo.query.filter_by(estado='Disponible').count()
-        total_rutas = Ruta.query.count()
-        rutas_activas = Ruta.query.filter_by(estado='En curso').count()
+        (total_vehiculos, vehiculos_disponibles,
+         total_rutas, rutas_activas) = obtener_conteos_dashboard()
         
         return render_template('index.html', 
                              total_vehiculos=total_vehiculos,
@@ -134,64 +216,63 @@ def index():
                              vehiculos_disponibles=0, rutas_activas=0)
 
 @app.route('/vehiculos')
+@handle_errors('index', 'Error cargando vehículos')
 def listar_vehiculos():
-    try:
-        page = request.args.get('page', 1, type=int)
-        search = request.args.get('search', '')
-        
-        query = Vehiculo.query
-        if search:
-            query = query.filter(
-                (Vehiculo.placa.contains(search)) |
-                (Vehiculo.marca.contains(search)) |
-                (Vehiculo.modelo.contains(search))
-            )
-        
-        vehiculos = query.paginate(
-            page=page, per_page=10, error_out=False
+    after = request.args.get('after', type=int)
+    search = request.args.get('search', '')
+    
+    # Rutas de la página en una sola consulta, solo con lo que muestra la lista
+    stmt = select(Vehiculo).options(
+        selectinload(Vehiculo.rutas).load_only(
+            Ruta.id, Ruta.nombre, Ruta.estado, Ruta.vehiculo_id
         )
-        
-        return render_template('vehiculos.html', 
-                             vehiculos=vehiculos, search=search)
-    except Exception as e:
-        logger.error(f"Error listando vehículos: {e}")
-        flash('Error cargando vehículos', 'error')
-        return redirect(url_for('index'))
+    )
+    # El trigram de FTS5 necesita al menos 3 caracteres
+    if search and app.config.get('BUSQUEDA_FTS') and len(search) >= 3:
+        stmt = stmt.where(Vehiculo.id.in_(ids_vehiculos_por_texto(search)))
+    elif search:
+        stmt = stmt.where(
+            (Vehiculo.placa.contains(search)) |
+            (Vehiculo.marca.contains(search)) |
+            (Vehiculo.modelo.contains(search))
+        )
+    
+    vehiculos = paginar_por_cursor(stmt, Vehiculo, after=after, per_page=10)
+    
+    return render_template('vehiculos.html', 
+                         vehiculos=vehiculos, search=search)
 
 @app.route('/rutas')
+@handle_errors('index', 'Error cargando rutas')
 def listar_rutas():
-    try:
-        page = request.args.get('page', 1, type=int)
-        search = request.args.get('search', '')
-        
-        query = Ruta.query
-        if search:
-            query = query.filter(
-                (Ruta.nombre.contains(search)) |
-                (Ruta.origen.contains(search)) |
-                (Ruta.destino.contains(search))
-            )
-        
-        rutas = query.paginate(
-            page=page, per_page=10, error_out=False
+    after = request.args.get('after', type=int)
+    search = request.args.get('search', '')
+    
+    stmt = select(Ruta).options(joinedload(Ruta.vehiculo_asignado))
+    if search:
+        stmt = stmt.where(
+            (Ruta.nombre.contains(search)) |
+            (Ruta.origen.contains(search)) |
+            (Ruta.destino.contains(search))
         )
-        
-        return render_template('rutas.html', 
-                             rutas=rutas, search=search)
-    except Exception as e:
-        logger.error(f"Error listando rutas: {e}")
-        flash('Error cargando rutas', 'error')
-        return redirect(url_for('index'))
+    
+    rutas = paginar_por_cursor(stmt, Ruta, after=after, per_page=10)
+    
+    return render_template('rutas.html', 
+                         rutas=rutas, search=search)
 
 @app.route('/nuevo_vehiculo', methods=['GET', 'POST'])
 def nuevo_vehiculo():
+    from forms import VehiculoForm
     form = VehiculoForm()
     
     if form.validate_on_submit():
         try:
             # Verificar placa duplicada
             placa_upper = form.placa.data.upper().strip()
-            if Vehiculo.query.filter_by(placa=placa_upper).first():
+            if db.session.execute(
+                select(Vehiculo).where(Vehiculo.placa == placa_upper)
+            ).scalar_one_or_none():
                 flash('Ya existe un vehículo con esa placa', 'error')
                 return render_template('nuevo_vehiculo.html', form=form)
             
@@ -228,21 +309,18 @@ def nuevo_vehiculo():
 
 @app.route('/nueva_ruta', methods=['GET', 'POST'])
 def nueva_ruta():
+    from forms import RutaForm
     form = RutaForm()
     
     # Poblar choices de vehículos disponibles
-    vehiculos_disponibles = Vehiculo.query.filter_by(estado='Disponible').all()
-    form.vehiculo_id.choices = [(0, 'Sin asignar')] + [
-        (v.id, f"{v.placa} - {v.marca} {v.modelo}") 
-        for v in vehiculos_disponibles
-    ]
+    form.vehiculo_id.choices = [(0, 'Sin asignar')] + obtener_choices_vehiculos_disponibles()
     
     if form.validate_on_submit():
         try:
             vehiculo = None
             # Validar lógica de negocio
             if form.vehiculo_id.data and form.vehiculo_id.data != 0:
-                vehiculo = Vehiculo.query.get(form.vehiculo_id.data)
+                vehiculo = db.session.get(Vehiculo, form.vehiculo_id.data)
                 if not vehiculo:
                     flash('El vehículo seleccionado no existe', 'error')
                     return render_template('nueva_ruta.html', form=form)
@@ -285,32 +363,28 @@ def nueva_ruta():
     return render_template('nueva_ruta.html', form=form)
 
 @app.route('/vehiculo/<int:id>')
+@handle_errors('listar_vehiculos', 'Error cargando detalle del vehículo')
 def detalle_vehiculo(id):
-    try:
-        vehiculo = Vehiculo.query.get_or_404(id)
-        return render_template('detalle_vehiculo.html', vehiculo=vehiculo)
-    except Exception as e:
-        logger.error(f"Error obteniendo detalle vehículo {id}: {e}")
-        flash('Error cargando detalle del vehículo', 'error')
-        return redirect(url_for('listar_vehiculos'))
+    vehiculo = db.get_or_404(Vehiculo, id)
+    return render_template('detalle_vehiculo.html', vehiculo=vehiculo)
 
 @app.route('/ruta/<int:id>')
+@handle_errors('listar_rutas', 'Error cargando detalle de la ruta')
 def detalle_ruta(id):
-    try:
-        ruta = Ruta.query.get_or_404(id)
-        return render_template('detalle_ruta.html', ruta=ruta)
-    except Exception as e:
-        logger.error(f"Error obteniendo detalle ruta {id}: {e}")
-        flash('Error cargando detalle de la ruta', 'error')
-        return redirect(url_for('listar_rutas'))
+    ruta = db.one_or_404(
+        select(Ruta).options(joinedload(Ruta.vehiculo_asignado)).where(Ruta.id == id)
+    )
+    return render_template('detalle_ruta.html', ruta=ruta)
 
 @app.route('/editar_ruta/<int:id>', methods=['GET', 'POST'])
 def editar_ruta(id):
+    from forms import RutaForm
     form = RutaForm()
-    ruta = Ruta.query.get_or_404(id)
+    ruta = db.one_or_404(
+        select(Ruta).options(joinedload(Ruta.vehiculo_asignado)).where(Ruta.id == id)
+    )
     
     # Poblar choices de vehículos disponibles + el vehículo actual
-    vehiculos_disponibles = Vehiculo.query.filter_by(estado='Disponible').all()
     choices = [(0, 'Sin asignar')]
     
     # Agregar vehículo actual si existe
@@ -318,9 +392,9 @@ def editar_ruta(id):
         choices.append((ruta.vehiculo_asignado.id, f"{ruta.vehiculo_asignado.placa} - {ruta.vehiculo_asignado.marca} {ruta.vehiculo_asignado.modelo} (Actual)"))
     
     # Agregar vehículos disponibles
-    for v in vehiculos_disponibles:
-        if not ruta.vehiculo_asignado or v.id != ruta.vehiculo_asignado.id:
-            choices.append((v.id, f"{v.placa} - {v.marca} {v.modelo}"))
+    for v_id, etiqueta in obtener_choices_vehiculos_disponibles():
+        if not ruta.vehiculo_asignado or v_id != ruta.vehiculo_asignado.id:
+            choices.append((v_id, etiqueta))
     
     form.vehiculo_id.choices = choices
     
@@ -329,7 +403,11 @@ def editar_ruta(id):
             # Validar lógica de negocio
             nuevo_vehiculo = None
             if form.vehiculo_id.data and form.vehiculo_id.data != 0:
-                nuevo_vehiculo = Vehiculo.query.get(form.vehiculo_id.data)
+                # El vehículo actual ya viene cargado con la ruta
+                if form.vehiculo_id.data == ruta.vehiculo_id:
+                    nuevo_vehiculo = ruta.vehiculo_asignado
+                else:
+                    nuevo_vehiculo = db.session.get(Vehiculo, form.vehiculo_id.data)
                 if not nuevo_vehiculo:
                     flash('El vehículo seleccionado no existe', 'error')
                     return render_template('editar_ruta.html', form=form, ruta=ruta)
@@ -382,36 +460,35 @@ def editar_ruta(id):
     return render_template('editar_ruta.html', form=form, ruta=ruta)
 
 @app.route('/eliminar_ruta/<int:id>', methods=['POST'])
+@handle_errors('listar_rutas', 'Error eliminando ruta')
 def eliminar_ruta(id):
-    try:
-        ruta = Ruta.query.get_or_404(id)
-        
-        # Liberar vehículo si está asignado
-        if ruta.vehiculo_asignado and ruta.estado == 'En curso':
-            ruta.vehiculo_asignado.estado = 'Disponible'
-        
-        db.session.delete(ruta)
-        db.session.commit()
-        
-        flash(f'Ruta "{ruta.nombre}" eliminada exitosamente', 'success')
-        return redirect(url_for('listar_rutas'))
-        
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Error eliminando ruta {id}: {e}")
-        flash('Error eliminando ruta', 'error')
-        return redirect(url_for('listar_rutas'))
+    ruta = db.one_or_404(
+        select(Ruta).options(joinedload(Ruta.vehiculo_asignado)).where(Ruta.id == id)
+    )
+    
+    # Liberar vehículo si está asignado
+    if ruta.vehiculo_asignado and ruta.estado == 'En curso':
+        ruta.vehiculo_asignado.estado = 'Disponible'
+    
+    db.session.delete(ruta)
+    db.session.commit()
+    
+    flash(f'Ruta "{ruta.nombre}" eliminada exitosamente', 'success')
+    return redirect(url_for('listar_rutas'))
 
 @app.route('/editar_vehiculo/<int:id>', methods=['GET', 'POST'])
 def editar_vehiculo(id):
+    from forms import VehiculoForm
     form = VehiculoForm()
-    vehiculo = Vehiculo.query.get_or_404(id)
+    vehiculo = db.get_or_404(Vehiculo, id)
     
     if form.validate_on_submit():
         try:
             # Verificar placa duplicada (excepto el actual)
             placa_upper = form.placa.data.upper().strip()
-            vehiculo_existente = Vehiculo.query.filter_by(placa=placa_upper).first()
+            vehiculo_existente = db.session.execute(
+                select(Vehiculo).where(Vehiculo.placa == placa_upper)
+            ).scalar_one_or_none()
             if vehiculo_existente and vehiculo_existente.id != vehiculo.id:
                 flash('Ya existe otro vehículo con esa placa', 'error')
                 return render_template('editar_vehiculo.html', form=form, vehiculo=vehiculo)
@@ -459,57 +536,57 @@ def editar_vehiculo(id):
     return render_template('editar_vehiculo.html', form=form, vehiculo=vehiculo)
 
 @app.route('/eliminar_vehiculo/<int:id>', methods=['POST'])
+@handle_errors('listar_vehiculos', 'Error eliminando vehículo')
 def eliminar_vehiculo(id):
-    try:
-        vehiculo = Vehiculo.query.get_or_404(id)
-        
-        # Verificar que no tenga rutas activas
-        if vehiculo.tiene_rutas_activas:
-            flash('No se puede eliminar un vehículo con rutas activas', 'error')
-            return redirect(url_for('listar_vehiculos'))
-        
-        # Verificar que no tenga rutas asociadas (programadas, completadas, etc.)
-        if vehiculo.rutas:
-            flash('No se puede eliminar un vehículo que tiene rutas asociadas', 'error')
-            return redirect(url_for('listar_vehiculos'))
-        
-        db.session.delete(vehiculo)
-        db.session.commit()
-        
-        flash(f'Vehículo "{vehiculo.placa}" eliminado exitosamente', 'success')
+    vehiculo = db.get_or_404(Vehiculo, id)
+    
+    # Verificar que no tenga rutas activas
+    if vehiculo.tiene_rutas_activas:
+        flash('No se puede eliminar un vehículo con rutas activas', 'error')
         return redirect(url_for('listar_vehiculos'))
-        
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Error eliminando vehículo {id}: {e}")
-        flash('Error eliminando vehículo', 'error')
+    
+    # Verificar que no tenga rutas asociadas (programadas, completadas, etc.)
+    if vehiculo.rutas:
+        flash('No se puede eliminar un vehículo que tiene rutas asociadas', 'error')
         return redirect(url_for('listar_vehiculos'))
+    
+    db.session.delete(vehiculo)
+    db.session.commit()
+    
+    flash(f'Vehículo "{vehiculo.placa}" eliminado exitosamente', 'success')
+    return redirect(url_for('listar_vehiculos'))
 
 # Función para validar estados consistentes
 def validar_estados_consistentes():
     """Valida que los estados de vehículos y rutas sean consistentes"""
     try:
-        # Vehículos que deberían estar "En Ruta" pero no lo están
-        vehiculos_con_rutas_activas = db.session.query(Vehiculo).join(Ruta).filter(
-            Ruta.estado == 'En curso',
-            Vehiculo.estado != 'En Ruta'
-        ).all()
-        
-        for vehiculo in vehiculos_con_rutas_activas:
-            logger.info(f"Corrigiendo estado de vehículo {vehiculo.placa}: {vehiculo.estado} -> En Ruta")
-            vehiculo.estado = 'En Ruta'
-        
-        # Vehículos "En Ruta" sin rutas activas
-        vehiculos_en_ruta = Vehiculo.query.filter_by(estado='En Ruta').all()
-        for vehiculo in vehiculos_en_ruta:
-            rutas_activas = Ruta.query.filter_by(
-                vehiculo_id=vehiculo.id, 
-                estado='En curso'
-            ).count()
+        # Un único flush de lo pendiente; las sentencias masivas no necesitan autoflush
+        db.session.flush()
+        with db.session.no_autoflush:
+            ruta_activa = exists().where(and_(
+                Ruta.vehiculo_id == Vehiculo.id,
+                Ruta.estado == 'En curso'
+            ))
+            
+            # Vehículos que deberían estar "En Ruta" pero no lo están
+            resultado = db.session.execute(
+                update(Vehiculo)
+                .where(Vehiculo.estado != 'En Ruta', ruta_activa)
+                .values(estado='En Ruta')
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount:
+                logger.info(f"Corrigiendo {resultado.rowcount} vehículo(s) -> En Ruta")
             
-            if rutas_activas == 0:
-                logger.info(f"Corrigiendo estado de vehículo {vehiculo.placa}: En Ruta -> Disponible")
-                vehiculo.estado = 'Disponible'
+            # Vehículos "En Ruta" sin rutas activas
+            resultado = db.session.execute(
+                update(Vehiculo)
+                .where(Vehiculo.estado == 'En Ruta', ~ruta_activa)
+                .values(estado='Disponible')
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount:
+                logger.info(f"Corrigiendo {resultado.rowcount} vehículo(s): En Ruta -> Disponible")
         
         db.session.commit()
         logger.info("Estados validados y corregidos")
@@ -0,0 +1,93 @@
+from flask_wtf import FlaskForm
+from wtforms import StringField, IntegerField, SelectField, FloatField
+from wtforms.validators import DataRequired, Length, NumberRange, ValidationError
+from wtforms.widgets import Select, html_params
+from markupsafe import Markup
+from functools import lru_cache
+
+# Validador personalizado para placas
+def validate_placa_format(form, field):
+    """Validador personalizado que asegura formato correcto de placa"""
+    placa = field.data.upper().strip()
+    
+    # Verificar que no esté vacía
+    if not placa:
+        raise ValidationError('La placa es obligatoria')
+    
+    # Verificar longitud
+    if len(placa) < 6 or len(placa) > 8:
+        raise ValidationError('La placa debe tener entre 6 y 8 caracteres')
+    
+    # Verificar caracteres válidos (solo letras y números)
+    if not placa.replace(' ', '').isalnum():
+        raise ValidationError('La placa solo puede contener letras y números')
+    
+    # Actualizar el campo con la versión en mayúsculas
+    field.data = placa
+
+# Formularios con validación
+class VehiculoForm(FlaskForm):
+    placa = StringField('Placa', validators=[
+        DataRequired(), 
+        Length(min=6, max=8, message="La placa debe tener entre 6 y 8 caracteres"),
+        validate_placa_format
+    ])
+    marca = StringField('Marca', validators=[DataRequired(), Length(max=50)])
+    modelo = StringField('Modelo', validators=[DataRequired(), Length(max=50)])
+    anio = IntegerField('Año', validators=[
+        DataRequired(), 
+        NumberRange(min=1990, max=2025, message="Año inválido")
+    ])
+    capacidad = IntegerField('Capacidad', validators=[
+        DataRequired(), 
+        NumberRange(min=1, max=100, message="Capacidad debe ser entre 1 y 100")
+    ])
+    estado = SelectField('Estado', choices=[
+        ('Disponible', 'Disponible'),
+        ('En Ruta', 'En Ruta'),
+        ('Mantenimiento', 'Mantenimiento')
+    ])
+
+# Select con las <option> cacheadas (la lista de vehículos se repite en cada render)
+@lru_cache(maxsize=128)
+def render_opciones(opciones):
+    """Renderiza una tupla de (valor, etiqueta, seleccionado) como <option>"""
+    return Markup("".join(
+        Select.render_option(valor, etiqueta, seleccionado)
+        for valor, etiqueta, seleccionado in opciones
+    ))
+
+class SelectCacheado(Select):
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault("id", field.id)
+        flags = getattr(field, "flags", {})
+        for k in dir(flags):
+            if k in self.validation_attrs and k not in kwargs:
+                kwargs[k] = getattr(flags, k)
+        opciones = tuple(
+            (valor, etiqueta, seleccionado)
+            for valor, etiqueta, seleccionado, _ in field.iter_choices()
+        )
+        return Markup(f"<select {html_params(name=field.name, **kwargs)}>"
+                      f"{render_opciones(opciones)}</select>")
+
+class RutaForm(FlaskForm):
+    nombre = StringField('Nombre', validators=[DataRequired(), Length(max=100)])
+    origen = StringField('Origen', validators=[DataRequired(), Length(max=100)])
+    destino = StringField('Destino', validators=[DataRequired(), Length(max=100)])
+    distancia = FloatField('Distancia (km)', validators=[
+        DataRequired(), 
+        NumberRange(min=0.1, message="La distancia debe ser mayor a 0")
+    ])
+    tiempo_estimado = IntegerField('Tiempo Estimado (min)', validators=[
+        DataRequired(), 
+        NumberRange(min=1, message="El tiempo debe ser mayor a 0")
+    ])
+    vehiculo_id = SelectField('Vehículo', coerce=int, validate_choice=False,
+                              widget=SelectCacheado())
+    estado = SelectField('Estado', choices=[
+        ('Programada', 'Programada'),
+        ('En curso', 'En curso'),
+        ('Completada', 'Completada'),
+        ('Cancelada', 'Cancelada')
+    ])
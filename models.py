@@ -1,16 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy import event
+from functools import lru_cache
+import time
+from sqlalchemy import event, inspect, exists, and_, select, func, text, column, Integer
+from sqlalchemy.types import TypeDecorator, String
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import validates
 
 # Inicializamos SQLAlchemy
 db = SQLAlchemy()
 
+@lru_cache(maxsize=1)
+def _anio_para_dia(dia):
+    return datetime.now().year
+
+def anio_actual():
+    """Año actual, recalculado como mucho una vez al día"""
+    return _anio_para_dia(int(time.time()) // 86400)
+
+class Placa(TypeDecorator):
+    """Normaliza la placa a mayúsculas solo al escribir en la base de datos"""
+    impl = String
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = value.upper().strip()
+        return value
+
 class Vehiculo(db.Model):
     __tablename__ = 'vehiculos'
+    __table_args__ = (
+        db.CheckConstraint('placa = UPPER(placa)', name='ck_vehiculos_placa_mayusculas'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    placa = db.Column(db.String(20), nullable=False, unique=True, index=True)
+    placa = db.Column(Placa(20), nullable=False, unique=True, index=True)
     marca = db.Column(db.String(50), nullable=False, index=True)
     modelo = db.Column(db.String(50), nullable=False)
     anio = db.Column(db.Integer, nullable=False)
@@ -20,14 +45,14 @@ class Vehiculo(db.Model):
     fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relación con rutas (one-to-many)
-    rutas = db.relationship('Ruta', backref='vehiculo_asignado', lazy=True, cascade='all, delete-orphan')
+    rutas = db.relationship('Ruta', back_populates='vehiculo_asignado', lazy=True, cascade='all, delete-orphan')
     
     # Validaciones
     @validates('placa')
     def validate_placa(self, key, value):
         if not value or len(value) < 6 or len(value) > 8:
             raise ValueError("La placa debe tener entre 6 y 8 caracteres")
-        return value.upper().strip()
+        return value
     
     @validates('anio')
     def validate_anio(self, key, value):
@@ -52,7 +77,15 @@ class Vehiculo(db.Model):
     @property
     def tiene_rutas_activas(self):
         """Verifica si el vehículo tiene rutas en curso"""
-        return any(ruta.estado == 'En curso' for ruta in self.rutas)
+        # Reutilizar la colección si ya se cargó (p. ej. con selectinload)
+        if 'rutas' not in inspect(self).unloaded:
+            return any(ruta.estado == 'En curso' for ruta in self.rutas)
+        return db.session.execute(
+            select(exists().where(and_(
+                Ruta.vehiculo_id == self.id,
+                Ruta.estado == 'En curso'
+            )))
+        ).scalar()
     
     @property
     def nombre_completo(self):
@@ -62,7 +95,7 @@ class Vehiculo(db.Model):
     @property
     def edad(self):
         """Calcula la edad del vehículo"""
-        return datetime.now().year - self.anio
+        return anio_actual() - self.anio
     
     def puede_ser_asignado(self):
         """Verifica si el vehículo puede ser asignado a una nueva ruta"""
@@ -85,6 +118,9 @@ class Vehiculo(db.Model):
 
 class Ruta(db.Model):
     __tablename__ = 'rutas'
+    __table_args__ = (
+        db.Index('ix_rutas_vehiculo_estado', 'vehiculo_id', 'estado'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -99,6 +135,9 @@ class Ruta(db.Model):
     fecha_inicio = db.Column(db.DateTime, nullable=True)
     fecha_fin = db.Column(db.DateTime, nullable=True)
     
+    # Relación con el vehículo (many-to-one)
+    vehiculo_asignado = db.relationship('Vehiculo', back_populates='rutas')
+    
     # Validaciones
     @validates('distancia')
     def validate_distancia(self, key, value):
@@ -187,6 +226,11 @@ class Ruta(db.Model):
 @event.listens_for(Ruta, 'before_update')
 def ruta_before_update(mapper, connection, target):
     """Mantiene consistencia cuando se actualiza una ruta"""
+    # Solo importa si cambió el estado o el vehículo asignado
+    attrs = inspect(target).attrs
+    if not (attrs.estado.history.has_changes() or attrs.vehiculo_id.history.has_changes()):
+        return
+    
     # Si la ruta pasa a 'En curso', asegurar que el vehículo esté 'En Ruta'
     if target.estado == 'En curso' and target.vehiculo_asignado:
         target.vehiculo_asignado.estado = 'En Ruta'
@@ -194,13 +238,13 @@ def ruta_before_update(mapper, connection, target):
     # Si la ruta se completa o cancela, liberar el vehículo
     elif target.estado in ['Completada', 'Cancelada'] and target.vehiculo_asignado:
         # Verificar que no tenga otras rutas activas
-        rutas_activas = db.session.query(Ruta).filter(
+        otras_rutas_activas = db.session.execute(select(exists().where(and_(
             Ruta.vehiculo_id == target.vehiculo_id,
             Ruta.estado == 'En curso',
             Ruta.id != target.id
-        ).count()
+        )))).scalar()
         
-        if rutas_activas == 0:
+        if not otras_rutas_activas:
             target.vehiculo_asignado.estado = 'Disponible'
 
 @event.listens_for(Ruta, 'before_delete')
@@ -208,11 +252,66 @@ def ruta_before_delete(mapper, connection, target):
     """Libera el vehículo cuando se elimina una ruta"""
     if target.vehiculo_asignado and target.estado == 'En curso':
         # Verificar que no tenga otras rutas activas
-        rutas_activas = db.session.query(Ruta).filter(
-            Ruta.vehiculo_id == target.vehiculo_id,
-            Ruta.estado == 'En curso',
-            Ruta.id != target.id
-        ).count()
+        rutas_activas = db.session.execute(
+            select(func.count()).select_from(Ruta).where(
+                Ruta.vehiculo_id == target.vehiculo_id,
+                Ruta.estado == 'En curso',
+                Ruta.id != target.id
+            )
+        ).scalar()
         
         if rutas_activas == 0:
-            target.vehiculo_asignado.estado = 'Disponible'
\ No newline at end of file
+            target.vehiculo_asignado.estado = 'Disponible'
+
+# Búsqueda de texto completo (SQLite FTS5) sobre placa, marca y modelo
+VEHICULOS_FTS_DDL = [
+    """CREATE VIRTUAL TABLE vehiculos_fts USING fts5(
+        placa, marca, modelo,
+        content='vehiculos', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS vehiculos_fts_ai AFTER INSERT ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(rowid, placa, marca, modelo)
+        VALUES (new.id, new.placa, new.marca, new.modelo);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vehiculos_fts_ad AFTER DELETE ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(vehiculos_fts, rowid, placa, marca, modelo)
+        VALUES ('delete', old.id, old.placa, old.marca, old.modelo);
+    END""",
+    # Solo cuando cambian columnas indexadas; se recrea para actualizar bases existentes
+    "DROP TRIGGER IF EXISTS vehiculos_fts_au",
+    """CREATE TRIGGER vehiculos_fts_au AFTER UPDATE OF placa, marca, modelo ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(vehiculos_fts, rowid, placa, marca, modelo)
+        VALUES ('delete', old.id, old.placa, old.marca, old.modelo);
+        INSERT INTO vehiculos_fts(rowid, placa, marca, modelo)
+        VALUES (new.id, new.placa, new.marca, new.modelo);
+    END""",
+]
+
+def crear_busqueda_vehiculos(engine):
+    """Crea el índice FTS5 de vehículos; devuelve False si el motor no lo soporta"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    
+    try:
+        with engine.begin() as conn:
+            existe = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='vehiculos_fts'"
+            )).first()
+            if not existe:
+                conn.execute(text(VEHICULOS_FTS_DDL[0]))
+                # Indexar los vehículos que ya existían
+                conn.execute(text("INSERT INTO vehiculos_fts(vehiculos_fts) VALUES ('rebuild')"))
+            for ddl in VEHICULOS_FTS_DDL[1:]:
+                conn.execute(text(ddl))
+    except OperationalError:
+        # SQLite compilado sin FTS5 o sin el tokenizador trigram
+        return False
+    return True
+
+def ids_vehiculos_por_texto(search):
+    """Subconsulta con los ids de vehículos cuya placa, marca o modelo contiene `search`"""
+    # Frase entre comillas: el tokenizador trigram la busca como subcadena
+    frase = '"' + search.replace('"', '""') + '"'
+    return text(
+        "SELECT rowid FROM vehiculos_fts WHERE vehiculos_fts MATCH :q"
+    ).bindparams(q=frase).columns(column('rowid', Integer))